@@ -6,7 +6,8 @@
 //
 // SPI protocol: Header = 10 bytes: <I H B B H  (little-endian)
 //   frame_id(u32), chunk_id(u16), flags(u8), rsv(u8), payload_len(u16)
-// Then payload_len bytes follow.
+// Header and payload arrive in ONE SPI transaction (single CS assertion),
+// payload_len taken from the header.
 //
 // Pins (per your table):
 //   SCLK=GPIO4, MISO=GPIO5, MOSI=GPIO6, CS=GPIO7, RDY=GPIO10(output to K210)
@@ -22,6 +23,7 @@
 
 #include "esp_log.h"
 #include "esp_err.h"
+#include "esp_attr.h"
 #include "esp_mac.h"
 
 #include "nvs_flash.h"
@@ -224,7 +226,7 @@ static void spi_slave_init_bus(void)
         .sclk_io_num = PIN_SCLK,
         .quadwp_io_num = -1,
         .quadhd_io_num = -1,
-        .max_transfer_sz = (PAYLOAD_MAX > HDR_LEN ? PAYLOAD_MAX : HDR_LEN),
+        .max_transfer_sz = HDR_LEN + PAYLOAD_MAX,
     };
 
     spi_slave_interface_config_t slvcfg = {
@@ -244,41 +246,31 @@ static void spi_slave_init_bus(void)
 // -----------------------------
 static void spi_udp_forward_loop(void)
 {
-    uint8_t hdr[HDR_LEN];
-    uint8_t payload[PAYLOAD_MAX];
+    // hdr + payload arrive back-to-back in one transaction; buffer is
+    // DMA'd, so keep it word-aligned and rounded up to a multiple of 4.
+    static WORD_ALIGNED_ATTR uint8_t rxbuf[(HDR_LEN + PAYLOAD_MAX + 3) & ~3];
     spi_slave_transaction_t t = {0};
 
     while (1)
     {
         set_rdy(1);
 
-        // Receive header (10 bytes)
+        // Receive [header + payload] as one burst; master clocks out
+        // HDR_LEN + payload_len bytes, we offer room for the maximum.
+        // DMA mode needs the length in whole 32-bit words, so offer the
+        // full (rounded) buffer; the transaction ends at CS deassert.
         memset(&t, 0, sizeof(t));
-        memset(hdr, 0, sizeof(hdr));
-        t.length = HDR_LEN * 8;
-        t.rx_buffer = hdr;
+        t.length = sizeof(rxbuf) * 8;
+        t.rx_buffer = rxbuf;
         ESP_ERROR_CHECK(spi_slave_transmit(SPI_HOST, &t, portMAX_DELAY));
 
-        // payload_len is last 2 bytes (little-endian)
-        uint16_t payload_len = (uint16_t)(hdr[8] | ((uint16_t)hdr[9] << 8));
+        // payload_len is last 2 bytes of the header (little-endian)
+        uint16_t payload_len = (uint16_t)(rxbuf[8] | ((uint16_t)rxbuf[9] << 8));
         if (payload_len > PAYLOAD_MAX)
             payload_len = PAYLOAD_MAX;
 
-        set_rdy(1);
-
-        // Receive payload
-        memset(&t, 0, sizeof(t));
-        memset(payload, 0, sizeof(payload));
-        t.length = payload_len * 8;
-        t.rx_buffer = payload;
-        ESP_ERROR_CHECK(spi_slave_transmit(SPI_HOST, &t, portMAX_DELAY));
-
-        // Forward via UDP: [hdr + payload]
-        uint8_t out[HDR_LEN + PAYLOAD_MAX];
-        memcpy(out, hdr, HDR_LEN);
-        memcpy(out + HDR_LEN, payload, payload_len);
-
-        sendto(udp_sock, out, HDR_LEN + payload_len, 0,
+        // Forward via UDP straight from the rx buffer (already [hdr + payload])
+        sendto(udp_sock, rxbuf, HDR_LEN + payload_len, 0,
                (struct sockaddr *)&udp_dst, sizeof(udp_dst));
     }
 }
@@ -1,38 +1,104 @@
-import socket, struct
+import os, selectors, socket, struct
 
 PORT = 5006
 HDR_LEN = 10
 FLAG_START = 1
 FLAG_END = 2
 
+# JPEG start/end-of-image markers
+SOI = b"\xff\xd8"
+EOI = b"\xff\xd9"
+
+# precompiled once; Struct.unpack_from skips per-call format parsing,
+# and the pre-bound method saves the attribute lookup per packet
+HDR = struct.Struct("<IHBBH")
+unpack_hdr = HDR.unpack_from
+
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 sock.bind(("0.0.0.0", PORT))
+sock.setblocking(False)
+
+# DefaultSelector is epoll on Linux; we park here between bursts
+sel = selectors.DefaultSelector()
+sel.register(sock, selectors.EVENT_READ)
+
 print("[pc] listening", PORT)
 
-cur = {}  # frame_id -> bytearray
+# one reusable receive buffer; recv_into avoids a fresh bytes object per packet
+RECV_MAX = 4096
+rxbuf = bytearray(RECV_MAX)
+rxmv = memoryview(rxbuf)
 
-while True:
-    data, _ = sock.recvfrom(4096)
-    if len(data) < HDR_LEN:
-        continue
+# fixed ring of preallocated reassembly buffers, indexed by frame_id;
+# no per-frame bytearray allocation or dict churn
+FRAME_MAX = 256 * 1024
+RING_SIZE = 4  # frames in flight; the sender pipelines at most 2
+
+ring_bufs = [bytearray(FRAME_MAX) for _ in range(RING_SIZE)]
+ring_frame = [None] * RING_SIZE  # frame_id assembling in each slot
+ring_used = [0] * RING_SIZE
+
+# opened once; each frame is pwrite'n at offset 0 and the file truncated
+# to the new length, skipping the per-frame open/close syscall pair
+OUT_PATH = "latest.jpg"
+out_fd = os.open(OUT_PATH, os.O_WRONLY | os.O_CREAT, 0o644)
 
-    frame_id, chunk_id, flags, rsv, payload_len = struct.unpack_from(
-        "<I H B B H", data, 0
-    )
-    payload = data[HDR_LEN : HDR_LEN + payload_len]
+# per-frame printing stalls the drain loop at stream rate; log 1-in-N
+LOG_EVERY = 30
+frames_done = 0
+
+
+def handle_packet(n):
+    global frames_done
+    if n < HDR_LEN:
+        return
+
+    frame_id, chunk_id, flags, rsv, payload_len = unpack_hdr(rxbuf)
+    if HDR_LEN + payload_len > n:
+        # truncated/forged datagram; slicing past n would pick up stale
+        # bytes from the previous packet in the reused buffer
+        return
+    payload = rxmv[HDR_LEN : HDR_LEN + payload_len]
+    slot = frame_id % RING_SIZE
 
     if flags & FLAG_START:
-        cur[frame_id] = bytearray()
+        ring_frame[slot] = frame_id
+        ring_used[slot] = 0
 
-    if frame_id not in cur:
-        # haven't seen START; drop
-        continue
+    if ring_frame[slot] != frame_id:
+        # haven't seen START (or slot taken over by a newer frame); drop
+        return
 
-    cur[frame_id].extend(payload)
+    used = ring_used[slot]
+    end = used + payload_len
+    if end > FRAME_MAX:
+        ring_frame[slot] = None  # runaway frame; drop it
+        return
+    ring_bufs[slot][used:end] = payload
+    ring_used[slot] = end
 
     if flags & FLAG_END:
-        jpg = cur.pop(frame_id)
-        fn = f"latest.jpg"
-        with open(fn, "wb") as f:
-            f.write(jpg)
-        print(f"[pc] wrote {fn} frame_id={frame_id} bytes={len(jpg)}")
+        ring_frame[slot] = None
+        jpg = memoryview(ring_bufs[slot])[:end]
+        # marker check catches frames with lost chunks before they hit
+        # disk; the two-byte compares are memcmp under the hood
+        if end < 4 or jpg[:2] != SOI or jpg[-2:] != EOI:
+            print(f"[pc] drop corrupt frame_id={frame_id} bytes={end}")
+            return
+        os.pwrite(out_fd, jpg, 0)
+        os.ftruncate(out_fd, end)
+        frames_done += 1
+        if frames_done % LOG_EVERY == 0:
+            print(f"[pc] wrote {OUT_PATH} frame_id={frame_id} bytes={end} total={frames_done}")
+
+
+while True:
+    # park in epoll until the first packet of a burst, then drain the
+    # socket queue so a whole batch of chunks costs one wakeup
+    sel.select()
+    while True:
+        try:
+            n = sock.recv_into(rxbuf)
+        except BlockingIOError:
+            break
+        handle_packet(n)